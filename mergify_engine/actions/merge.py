@@ -31,6 +31,8 @@ from mergify_engine.rules import types
 
 LOG = daiquiri.getLogger(__name__)
 
+PENDING_CHECK_STATES = frozenset(("pending", None))
+
 
 class MergeAction(merge_base.MergeBaseAction):
 
@@ -107,36 +109,40 @@ class MergeAction(merge_base.MergeBaseAction):
         if ctxt.have_been_synchronized():
             return True
 
+        # TODO(sileht): Just return True here, no need to checks checks anymore,
+        # this method is no more used by teh merge queue
+        missing_checks_conditions = [
+            condition
+            for condition in rule.missing_conditions
+            if condition.get_attribute_name().startswith(("check-", "status-"))
+        ]
+        if len(missing_checks_conditions) != len(rule.missing_conditions):
+            # something else does not match anymore
+            return True
+
         need_look_at_checks = await self._get_branch_protection_conditions(ctxt)
-        for condition in rule.missing_conditions:
-            attribute_name = condition.get_attribute_name()
-            if attribute_name.startswith("check-") or attribute_name.startswith(
-                "status-"
-            ):
-                # TODO(sileht): Just return True here, no need to checks checks anymore,
-                # this method is no more used by teh merge queue
-                need_look_at_checks.append(condition)
-            else:
-                # something else does not match anymore
-                return True
+        need_look_at_checks.extend(missing_checks_conditions)
 
         if need_look_at_checks:
-            if not await ctxt.checks:
+            checks = await ctxt.checks
+            if not checks:
                 return False
 
-            states = [
-                state
-                for name, state in (await ctxt.checks).items()
-                for cond in need_look_at_checks
-                if await cond(utils.FakePR(cond.get_attribute_name(), name))
+            conditions_with_attribute_name = [
+                (cond, cond.get_attribute_name()) for cond in need_look_at_checks
             ]
-            if not states:
+            found_check = False
+            for name, state in checks.items():
+                for cond, attribute_name in conditions_with_attribute_name:
+                    if await cond(utils.FakePR(attribute_name, name)):
+                        if state in PENDING_CHECK_STATES:
+                            return False
+                        found_check = True
+                        break
+
+            if not found_check:
                 return False
 
-            for state in states:
-                if state in ("pending", None):
-                    return False
-
         return True
 
     async def _get_queue(self, ctxt: context.Context) -> queue.QueueBase:
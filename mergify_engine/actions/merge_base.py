@@ -47,8 +47,12 @@ BRANCH_PROTECTION_FAQ_URL = (
     "my-branch-protection-settings"
 )
 
-MARKDOWN_TITLE_RE = re.compile(r"^#+ ", re.I)
-MARKDOWN_COMMIT_MESSAGE_RE = re.compile(r"^#+ Commit Message ?:?\s*$", re.I)
+MARKDOWN_TITLE_RE = re.compile(r"^#+ ", re.M)
+# The header is ASCII only, explicit character classes avoid the
+# unicode case folding done by re.I on each character
+MARKDOWN_COMMIT_MESSAGE_RE = re.compile(
+    r"^#+ [Cc][Oo][Mm][Mm][Ii][Tt] [Mm][Ee][Ss][Ss][Aa][Gg][Ee] ?:?[^\S\n]*$", re.M
+)
 REQUIRED_STATUS_RE = re.compile(r'Required status check "([^"]*)" is expected.')
 FORBIDDEN_MERGE_COMMITS_MSG = "Merge commits are not allowed on this repository."
 FORBIDDEN_SQUASH_MERGE_MSG = "Squash merges are not allowed on this repository."
@@ -102,9 +106,34 @@ def strict_merge_parameter(v):
     raise ValueError(f"{v} is an unknown strict merge parameter")
 
 
+def _first_non_empty_line(lines: typing.List[str], start: int = 0) -> int:
+    for i in range(start, len(lines)):
+        if lines[i].strip():
+            return i
+    return len(lines)
+
+
 class MergeBaseAction(actions.Action):
     only_once = True
 
+    rebase_not_possible_check_report = check_api.Result(
+        check_api.Conclusion.ACTION_REQUIRED,
+        "Automatic rebasing is not possible, manual intervention required",
+        "",
+    )
+
+    head_branch_modified_check_report = check_api.Result(
+        check_api.Conclusion.CANCELLED,
+        "Head branch was modified in the meantime",
+        "The head branch was modified, the merge action has been cancelled.",
+    )
+
+    unexpected_merge_state_check_report = check_api.Result(
+        check_api.Conclusion.FAILURE,
+        "Unexpected after merge pull request state",
+        "The pull request has been merged while GitHub API still reports it as opened.",
+    )
+
     @abc.abstractmethod
     async def _should_be_queued(self, ctxt: context.Context, q: queue.QueueT) -> bool:
         pass
@@ -386,47 +415,74 @@ class MergeBaseAction(actions.Action):
             return await self.get_strict_status(ctxt, rule, q, is_behind=False)
 
     @staticmethod
-    async def _get_commit_message(pull_request, mode="default"):
-        body = await pull_request.body
+    def _get_commit_message_lines(body: str) -> typing.Optional[typing.List[str]]:
+        header = MARKDOWN_COMMIT_MESSAGE_RE.search(body)
+        if header is None:
+            return None
 
-        if mode == "title+body":
-            # Include PR number to mimic default GitHub format
-            return (
-                f"{(await pull_request.title)} (#{(await pull_request.number)})",
-                body,
-            )
+        # Repeated commit message headers don't end the section, they are skipped
+        has_repeated_header = False
+        pos = header.end()
+        while True:
+            next_title = MARKDOWN_TITLE_RE.search(body, pos)
+            if next_title is None:
+                section_end = len(body)
+                break
+            repeated_header = MARKDOWN_COMMIT_MESSAGE_RE.match(body, next_title.start())
+            if repeated_header is None:
+                # -1 to drop the newline ending the previous line
+                section_end = next_title.start() - 1
+                break
+            has_repeated_header = True
+            pos = repeated_header.end()
+
+        # The first line is the empty end of the header line, it's skipped with
+        # the other leading empty lines
+        lines = body[header.end() : section_end].split("\n")
+        if has_repeated_header:
+            lines = [
+                line for line in lines if not MARKDOWN_COMMIT_MESSAGE_RE.match(line)
+            ]
+        return lines
+
+    @staticmethod
+    async def _get_commit_message_title_body(pull_request):
+        # Include PR number to mimic default GitHub format
+        return (
+            f"{(await pull_request.title)} (#{(await pull_request.number)})",
+            await pull_request.body,
+        )
+
+    @staticmethod
+    async def _get_commit_message(pull_request):
+        body = await pull_request.body
 
         if not body:
             return
 
-        found = False
-        message_lines = []
+        # Most pull requests don't have a commit message section
+        if "commit message" not in body.lower():
+            return
 
-        for line in body.split("\n"):
-            if MARKDOWN_COMMIT_MESSAGE_RE.match(line):
-                found = True
-            elif found and MARKDOWN_TITLE_RE.match(line):
-                break
-            elif found:
-                message_lines.append(line)
+        message_lines = MergeBaseAction._get_commit_message_lines(body)
+        if message_lines is None:
+            return
 
-        # Remove the first empty lines
-        message_lines = list(
-            itertools.dropwhile(lambda x: not x.strip(), message_lines)
-        )
+        # Skip the first empty lines
+        title_index = _first_non_empty_line(message_lines)
 
-        if found and message_lines:
-            title = message_lines.pop(0)
+        if title_index < len(message_lines):
+            title = message_lines[title_index]
 
             # Remove the empty lines between title and message body
-            message_lines = list(
-                itertools.dropwhile(lambda x: not x.strip(), message_lines)
-            )
+            message_lines = message_lines[
+                _first_non_empty_line(message_lines, title_index + 1) :
+            ]
 
             return (
                 await pull_request.render_template(title.strip()),
                 await pull_request.render_template(
-                    "\n".join(line.strip() for line in message_lines)
+                    "\n".join([line.strip() for line in message_lines])
                 ),
             )
 
@@ -436,30 +492,33 @@ class MergeBaseAction(actions.Action):
         rule: "rules.EvaluatedRule",
         q: queue.QueueT,
     ) -> check_api.Result:
-        if self.config["method"] != "rebase" or ctxt.pull["rebaseable"]:
-            method = self.config["method"]
-        elif self.config["rebase_fallback"]:
+        # ctxt.update() replaces ctxt.pull, so this alias must not be used
+        # once the merge has been requested
+        pull = ctxt.pull
+
+        method = self.config["method"]
+        if method == "rebase" and not pull["rebaseable"]:
             method = self.config["rebase_fallback"]
-        else:
-            return check_api.Result(
-                check_api.Conclusion.ACTION_REQUIRED,
-                "Automatic rebasing is not possible, manual intervention required",
-                "",
-            )
+            if not method:
+                return self.rebase_not_possible_check_report
 
-        data = {}
+        data = {"sha": pull["head"]["sha"], "merge_method": method}
 
-        try:
-            commit_title_and_message = await self._get_commit_message(
-                ctxt.pull_request,
-                self.config["commit_message"],
-            )
-        except context.RenderTemplateFailure as rmf:
-            return check_api.Result(
-                check_api.Conclusion.ACTION_REQUIRED,
-                "Invalid commit message",
-                str(rmf),
+        if self.config["commit_message"] == "title+body":
+            commit_title_and_message = await self._get_commit_message_title_body(
+                ctxt.pull_request
             )
+        else:
+            try:
+                commit_title_and_message = await self._get_commit_message(
+                    ctxt.pull_request
+                )
+            except context.RenderTemplateFailure as rmf:
+                return check_api.Result(
+                    check_api.Conclusion.ACTION_REQUIRED,
+                    "Invalid commit message",
+                    str(rmf),
+                )
 
         if commit_title_and_message is not None:
             title, message = commit_title_and_message
@@ -468,9 +527,6 @@ class MergeBaseAction(actions.Action):
             if message:
                 data["commit_message"] = message
 
-        data["sha"] = ctxt.pull["head"]["sha"]
-        data["merge_method"] = method
-
         bot_account = self.config["merge_bot_account"]
         if bot_account:
             user_tokens = await ctxt.repository.installation.get_user_tokens()
@@ -486,7 +542,7 @@ class MergeBaseAction(actions.Action):
 
         try:
             await ctxt.client.put(
-                f"{ctxt.base_url}/pulls/{ctxt.pull['number']}/merge",
+                f"{ctxt.base_url}/pulls/{pull['number']}/merge",
                 oauth_token=oauth_token,  # type: ignore
                 json=data,
             )
@@ -504,11 +560,7 @@ class MergeBaseAction(actions.Action):
         if result:
             return result
         else:
-            return check_api.Result(
-                check_api.Conclusion.FAILURE,
-                "Unexpected after merge pull request state",
-                "The pull request has been merged while GitHub API still reports it as opened.",
-            )
+            return self.unexpected_merge_state_check_report
 
     async def _handle_merge_error(
         self,
@@ -523,11 +575,7 @@ class MergeBaseAction(actions.Action):
                 status_code=e.status_code,
                 error_message=e.message,
             )
-            return check_api.Result(
-                check_api.Conclusion.CANCELLED,
-                "Head branch was modified in the meantime",
-                "The head branch was modified, the merge action has been cancelled.",
-            )
+            return self.head_branch_modified_check_report
         elif "Base branch was modified" in e.message:
             # NOTE(sileht): The base branch was modified between pull.is_behind call and
             # here, usually by something not merged by mergify. So we need sync it again
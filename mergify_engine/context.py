@@ -16,6 +16,7 @@
 import base64
 import contextlib
 import dataclasses
+import functools
 import itertools
 import json
 import logging
@@ -48,6 +49,8 @@ if typing.TYPE_CHECKING:
 
 SUMMARY_SHA_EXPIRATION = 60 * 60 * 24 * 31  # ~ 1 Month
 
+_JINJA_ENV = jinja2.sandbox.SandboxedEnvironment(undefined=jinja2.StrictUndefined)
+
 
 class MergifyConfigFile(github_types.GitHubContentFile):
     decoded_content: bytes
@@ -1065,11 +1068,13 @@ class PullRequest:
         "files",
     }
 
+    ALL_ATTRIBUTES = ATTRIBUTES | LIST_ATTRIBUTES
+
     async def __getattr__(self, name):
         return await self.context._get_consolidated_data(name.replace("_", "-"))
 
     def __iter__(self):
-        return iter(self.ATTRIBUTES | self.LIST_ATTRIBUTES)
+        return iter(self.ALL_ATTRIBUTES)
 
     async def items(self):
         d = {}
@@ -1079,18 +1084,26 @@ class PullRequest:
 
     async def render_template(self, template, extra_variables=None):
         """Render a template interpolating variables based on pull request attributes."""
-        env = jinja2.sandbox.SandboxedEnvironment(
-            undefined=jinja2.StrictUndefined,
-        )
         with self._template_exceptions_mapping():
-            used_variables = jinja2.meta.find_undeclared_variables(env.parse(template))
-            infos = {}
-            for k in used_variables:
-                if extra_variables and k in extra_variables:
-                    infos[k] = extra_variables[k]
-                else:
-                    infos[k] = await getattr(self, k)
-            return env.from_string(template).render(**infos)
+            compiled_template, used_variables = self._compile_template(template)
+            infos = dict(extra_variables) if extra_variables else {}
+            for k in used_variables - infos.keys():
+                infos[k] = await getattr(self, k)
+            return compiled_template.render(**infos)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _compile_template(
+        template: str,
+    ) -> typing.Tuple[jinja2.Template, typing.FrozenSet[str]]:
+        # Templates are mostly the same for all pull requests of
+        # a repository (commit message, comments, ...), so parse and compile
+        # them only once.
+        ast = _JINJA_ENV.parse(template)
+        return (
+            _JINJA_ENV.from_string(ast),
+            frozenset(jinja2.meta.find_undeclared_variables(ast)),
+        )
 
     @staticmethod
     @contextlib.contextmanager
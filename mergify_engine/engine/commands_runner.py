@@ -12,6 +12,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
 import re
 import typing
 
@@ -56,6 +57,11 @@ async def post_comment(
         )
 
 
+@functools.lru_cache(maxsize=None)
+def _get_command_schema(action_class: typing.Type[actions.Action]) -> voluptuous.Schema:
+    return voluptuous.Schema(action_class.get_schema())
+
+
 def load_action(
     message: str,
 ) -> typing.Optional[typing.Tuple[str, str, actions.Action]]:
@@ -68,7 +74,7 @@ def load_action(
         action_class = action_classes[match[1]]
         command_args = match[2].strip()
         config = action_class.command_to_config(command_args)
-        action = voluptuous.Schema(action_class.get_schema())(config)
+        action = _get_command_schema(action_class)(config)
         return match[1], command_args, action
 
     return None
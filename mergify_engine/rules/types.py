@@ -16,17 +16,12 @@
 import dataclasses
 import typing
 
-import jinja2.exceptions
-import jinja2.sandbox
 import voluptuous
 
 from mergify_engine import context
 from mergify_engine import github_types
 
 
-_JINJA_ENV = jinja2.sandbox.SandboxedEnvironment(undefined=jinja2.StrictUndefined)
-
-
 @dataclasses.dataclass
 class LineColumnPath:
     line: int
@@ -62,18 +57,12 @@ class DummyPullRequest(context.PullRequest):
 
     def render_template(self, template, extra_variables=None):
         """Render a template interpolating variables based on pull request attributes."""
-        env = jinja2.sandbox.SandboxedEnvironment(
-            undefined=jinja2.StrictUndefined,
-        )
         with self._template_exceptions_mapping():
-            used_variables = jinja2.meta.find_undeclared_variables(env.parse(template))
-            infos = {}
-            for k in used_variables:
-                if extra_variables and k in extra_variables:
-                    infos[k] = extra_variables[k]
-                else:
-                    infos[k] = getattr(self, k)
-            return env.from_string(template).render(**infos)
+            compiled_template, used_variables = self._compile_template(template)
+            infos = dict(extra_variables) if extra_variables else {}
+            for k in used_variables - infos.keys():
+                infos[k] = getattr(self, k)
+            return compiled_template.render(**infos)
 
 
 _DUMMY_PR = DummyPullRequest(
@@ -14,11 +14,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 import asyncio
-import copy
+import collections
+import contextlib
 import datetime
 import json
 import os
-import queue
 import re
 import shutil
 import time
@@ -28,16 +28,13 @@ from unittest import mock
 import daiquiri
 import github as pygithub
 import httpx
+import orjson
 import pytest
 import vcr
 import vcr.stubs.urllib3_stubs
-import yaml
 
-from mergify_engine import branch_updater
 from mergify_engine import config
 from mergify_engine import context
-from mergify_engine import duplicate_pull
-from mergify_engine import engine
 from mergify_engine import gitter
 from mergify_engine import subscription
 from mergify_engine import user_tokens
@@ -54,6 +51,75 @@ RECORD = bool(os.getenv("MERGIFYENGINE_RECORD", False))
 CASSETTE_LIBRARY_DIR_BASE = "zfixtures/cassettes"
 FAKE_DATA = "whatdataisthat"
 FAKE_HMAC = utils.compute_hmac(FAKE_DATA.encode("utf8"))
+GIT_CREDENTIALS_RE = re.compile(r"://[^@]*@")
+CLEANUP_MAX_CONCURRENCY = 8
+BRANCH_PROTECTION_MEDIA_TYPE = "application/vnd.github.luke-cage-preview+json"
+RESPONSE_HEADERS_FILTERED = frozenset(
+    (
+        "CF-Cache-Status",
+        "CF-RAY",
+        "Expect-CT",
+        "Report-To",
+        "NEL",
+        "cf-request-id",
+        "Via",
+        "X-GitHub-Request-Id",
+        "Date",
+        "ETag",
+        "X-RateLimit-Reset",
+        "Expires",
+        "Fastly-Request-ID",
+        "X-Timer",
+        "X-Served-By",
+        "Last-Modified",
+        "X-RateLimit-Remaining",
+        "X-Runtime-rack",
+        "Access-Control-Allow-Origin",
+        "Access-Control-Expose-Headers",
+        "Cache-Control",
+        "Content-Security-Policy",
+        "Referrer-Policy",
+        "Server",
+        "Status",
+        "Strict-Transport-Security",
+        "Vary",
+        "X-Content-Type-Options",
+        "X-Frame-Options",
+        "X-XSS-Protection",
+    )
+)
+EVENT_LOG_DROPPED_KEYS = frozenset(
+    (
+        "installation",
+        "sender",
+        "repository",
+        "base",
+        "head",
+        "id",
+        "node_id",
+        "tree_id",
+        "_links",
+        "user",
+        "body",
+        "after",
+        "before",
+        "app",
+        "timestamp",
+        "external_id",
+    )
+)
+EVENT_LOG_NESTED_DROPPED_KEYS = {
+    "organization": ("description",),
+    "check_run": ("checks_suite",),
+}
+
+
+def write_files(directory, files):
+    for name, content in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
 
 
 class GitterRecorder(gitter.Gitter):
@@ -61,7 +127,7 @@ class GitterRecorder(gitter.Gitter):
         super(GitterRecorder, self).__init__(logger)
         self.cassette_path = os.path.join(cassette_library_dir, f"git-{suffix}.json")
         if RECORD:
-            self.records = []
+            self.records = collections.deque()
         else:
             self.load_records()
 
@@ -69,13 +135,11 @@ class GitterRecorder(gitter.Gitter):
         if not os.path.exists(self.cassette_path):
             raise RuntimeError(f"Cassette {self.cassette_path} not found")
         with open(self.cassette_path, "rb") as f:
-            data = f.read().decode("utf8")
-            self.records = json.loads(data)
+            self.records = collections.deque(orjson.loads(f.read()))
 
     def save_records(self):
         with open(self.cassette_path, "wb") as f:
-            data = json.dumps(self.records)
-            f.write(data.encode("utf8"))
+            f.write(orjson.dumps(list(self.records)))
 
     async def __call__(self, *args, **kwargs):
         if RECORD:
@@ -103,7 +167,7 @@ class GitterRecorder(gitter.Gitter):
                 )
             return output
         else:
-            r = self.records.pop(0)
+            r = self.records.popleft()
             if "exc" in r:
                 raise gitter.GitError(
                     returncode=r["exc"]["returncode"],
@@ -119,12 +183,16 @@ class GitterRecorder(gitter.Gitter):
                 return r["out"]
 
     def prepare_args(self, args):
-        return [arg.replace(self.tmp, "/tmp/mergify-gitter<random>") for arg in args]
+        tmp = self.tmp
+        return [
+            arg.replace(tmp, "/tmp/mergify-gitter<random>") if tmp in arg else arg
+            for arg in args
+        ]
 
     @staticmethod
     def prepare_kwargs(kwargs):
-        if "_input" in kwargs:
-            kwargs["_input"] = re.sub(r"://[^@]*@", "://<TOKEN>:@", kwargs["_input"])
+        if "_input" in kwargs and "@" in kwargs["_input"]:
+            kwargs["_input"] = GIT_CREDENTIALS_RE.sub("://<TOKEN>:@", kwargs["_input"])
         return kwargs
 
     async def cleanup(self):
@@ -139,7 +207,7 @@ class EventReader:
     def __init__(self, app):
         self._app = app
         self._session = http.AsyncClient()
-        self._handled_events = queue.Queue()
+        self._handled_events = collections.deque()
         self._counter = 0
 
     async def drain(self):
@@ -152,6 +220,9 @@ class EventReader:
         )
         r.raise_for_status()
 
+    async def aclose(self):
+        await self._session.aclose()
+
     async def wait_for(self, event_type, expected_payload, timeout=15 if RECORD else 2):
         LOG.log(
             42,
@@ -161,22 +232,22 @@ class EventReader:
             expected_payload,
         )
 
+        match = self._compile_matcher(expected_payload)
         started_at = time.monotonic()
         while time.monotonic() - started_at < timeout:
             try:
-                event = self._handled_events.get(block=False)
-                await self._forward_to_engine_api(event)
-            except queue.Empty:
-                for event in await self._get_events():
-                    self._handled_events.put(event)
-                else:
-                    if RECORD:
-                        time.sleep(1)
+                event = self._handled_events.popleft()
+            except IndexError:
+                events = await self._get_events()
+                self._handled_events.extend(events)
+                if not events and RECORD:
+                    # Only throttle the forwarder when it has
+                    # nothing for us, and never block the event loop
+                    await asyncio.sleep(1)
                 continue
 
-            if event["type"] == event_type and self._match(
-                event["payload"], expected_payload
-            ):
+            await self._forward_to_engine_api(event)
+            if event["type"] == event_type and match(event["payload"]):
                 return
 
         raise Exception(
@@ -184,16 +255,36 @@ class EventReader:
         )
 
     @classmethod
-    def _match(cls, data, expected_data):
-        if isinstance(expected_data, dict):
-            for key, expected in expected_data.items():
-                if key not in data:
-                    return False
-                if not cls._match(data[key], expected):
-                    return False
-            return True
+    def _compile_matcher(cls, expected_data):
+        if (
+            isinstance(expected_data, dict)
+            and len(expected_data) == 1
+            and not isinstance(next(iter(expected_data.values())), dict)
+        ):
+            # Most tests wait for a single {"action": ...}-like
+            # payload, so compare it directly
+            ((key, expected),) = expected_data.items()
+
+            def match(data):
+                return isinstance(data, dict) and key in data and data[key] == expected
+
+        elif isinstance(expected_data, dict):
+            matchers = [
+                (key, cls._compile_matcher(expected))
+                for key, expected in expected_data.items()
+            ]
+
+            def match(data):
+                return isinstance(data, dict) and all(
+                    key in data and matcher(data[key]) for key, matcher in matchers
+                )
+
         else:
-            return data == expected_data
+
+            def match(data):
+                return data == expected_data
+
+        return match
 
     async def _get_events(self):
         # NOTE(sileht): we use a counter to make each call unique in cassettes
@@ -224,7 +315,7 @@ class EventReader:
             event["type"],
             payload.get("action"),
             extra,
-            self._remove_useless_links(copy.deepcopy(event)),
+            _ScrubbedEvent(event),
         )
         r = await self._app.post(
             "/event",
@@ -232,47 +323,46 @@ class EventReader:
                 "X-GitHub-Event": event["type"],
                 "X-GitHub-Delivery": "123456789",
                 "X-Hub-Signature": "sha1=whatever",
-                "Content-type": "application/json",
             },
-            data=json.dumps(payload),
+            json=payload,
         )
         return r
 
-    @classmethod
-    def _remove_useless_links(cls, data):
-        if isinstance(data, dict):
-            data.pop("installation", None)
-            data.pop("sender", None)
-            data.pop("repository", None)
-            data.pop("base", None)
-            data.pop("head", None)
-            data.pop("id", None)
-            data.pop("node_id", None)
-            data.pop("tree_id", None)
-            data.pop("_links", None)
-            data.pop("user", None)
-            data.pop("body", None)
-            data.pop("after", None)
-            data.pop("before", None)
-            data.pop("app", None)
-            data.pop("timestamp", None)
-            data.pop("external_id", None)
-            if "organization" in data:
-                data["organization"].pop("description", None)
-            if "check_run" in data:
-                data["check_run"].pop("checks_suite", None)
-            for key, value in list(data.items()):
-                if key.endswith("url"):
-                    del data[key]
-                elif key.endswith("_at"):
-                    del data[key]
-                else:
-                    data[key] = cls._remove_useless_links(value)
-            return data
-        elif isinstance(data, list):
-            return [cls._remove_useless_links(elem) for elem in data]
-        else:
-            return data
+    @staticmethod
+    def _remove_useless_links(data):
+        # Build a scrubbed copy instead of mutating the event, so
+        # the payload we forward to the engine doesn't need to be deepcopied
+        result = [None]
+        stack = [(data, result, 0, ())]
+        while stack:
+            elem, parent, index, extra_dropped_keys = stack.pop()
+            if isinstance(elem, dict):
+                new = parent[index] = {}
+                for key, value in elem.items():
+                    if (
+                        key in EVENT_LOG_DROPPED_KEYS
+                        or key in extra_dropped_keys
+                        or key.endswith(("url", "_at"))
+                    ):
+                        continue
+                    new[key] = None
+                    stack.append(
+                        (value, new, key, EVENT_LOG_NESTED_DROPPED_KEYS.get(key, ()))
+                    )
+            elif isinstance(elem, list):
+                new = parent[index] = [None] * len(elem)
+                stack.extend((value, new, i, ()) for i, value in enumerate(elem))
+            else:
+                parent[index] = elem
+        return result[0]
+
+
+class _ScrubbedEvent:
+    def __init__(self, event):
+        self.event = event
+
+    def __str__(self):
+        return str(EventReader._remove_useless_links(self.event))
 
 
 @pytest.mark.usefixtures("logger_checker")
@@ -291,6 +381,8 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
 
     async def asyncSetUp(self):
         super(FunctionalTestBase, self).setUp()
+        self._patches = contextlib.ExitStack()
+        self.addCleanup(self._patches.close)
         self.existing_labels = []
         self.pr_counter = 0
         self.git_counter = 0
@@ -326,14 +418,18 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
             github.CachedToken.STORAGE = {}
         else:
             # Never expire token during replay
-            mock.patch.object(
-                github_app, "get_or_create_jwt", return_value="<TOKEN>"
-            ).start()
-            mock.patch.object(
-                github.GithubAppInstallationAuth,
-                "get_access_token",
-                return_value="<TOKEN>",
-            ).start()
+            self._patches.enter_context(
+                mock.patch.object(
+                    github_app, "get_or_create_jwt", return_value="<TOKEN>"
+                )
+            )
+            self._patches.enter_context(
+                mock.patch.object(
+                    github.GithubAppInstallationAuth,
+                    "get_access_token",
+                    return_value="<TOKEN>",
+                )
+            )
 
             # NOTE(sileht): httpx pyvcr stubs does not replay auth_flow as it directly patch client.send()
             # So anything occurring during auth_flow have to be mocked during replay
@@ -353,24 +449,26 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
                     get_auth(owner_name, owner_id, auth)
                 )
 
-            mock.patch.object(github, "aget_client", github_aclient).start()
-
-        with open(engine.mergify_rule_path, "r") as f:
-            engine.MERGIFY_RULE = yaml.safe_load(
-                f.read().replace("mergify[bot]", "mergify-test[bot]")
+            self._patches.enter_context(
+                mock.patch.object(github, "aget_client", github_aclient)
             )
 
-        mock.patch.object(branch_updater.gitter, "Gitter", self.get_gitter).start()
-        mock.patch.object(duplicate_pull.gitter, "Gitter", self.get_gitter).start()
+        # branch_updater and duplicate_pull both use gitter.Gitter, so one
+        # patch on gitter.Gitter covers both
+        self._patches.enter_context(
+            mock.patch.object(gitter, "Gitter", self.get_gitter)
+        )
 
         if not RECORD:
             # NOTE(sileht): Don't wait exponentialy during replay
-            mock.patch.object(
-                context.Context._ensure_complete.retry, "wait", None
-            ).start()
+            self._patches.enter_context(
+                mock.patch.object(context.Context._ensure_complete.retry, "wait", None)
+            )
 
         # Web authentification always pass
-        mock.patch("hmac.compare_digest", return_value=True).start()
+        self._patches.enter_context(
+            mock.patch("hmac.compare_digest", return_value=True)
+        )
 
         branch_prefix_path = os.path.join(self.cassette_library_dir, "branch_prefix")
 
@@ -445,6 +543,7 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
         assert self.u_fork.login in ["mergify-test2", "mergify-test3"]
 
         self.r_o_admin = self.o_admin.get_repo(self.REPO_NAME)
+        self.branches_api_url = f"{self.r_o_admin.url}/branches/"
         self.r_o_integration = self.o_integration.get_repo(self.REPO_NAME)
         self.r_fork = self.u_fork.get_repo(self.REPO_NAME)
 
@@ -490,15 +589,19 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
                 set(),
             )
 
-        mock.patch(
-            "mergify_engine.subscription.Subscription._retrieve_subscription_from_db",
-            side_effect=fake_retrieve_subscription_from_db,
-        ).start()
+        self._patches.enter_context(
+            mock.patch(
+                "mergify_engine.subscription.Subscription._retrieve_subscription_from_db",
+                side_effect=fake_retrieve_subscription_from_db,
+            )
+        )
 
-        mock.patch(
-            "mergify_engine.subscription.Subscription.get_subscription",
-            side_effect=fake_subscription,
-        ).start()
+        self._patches.enter_context(
+            mock.patch(
+                "mergify_engine.subscription.Subscription.get_subscription",
+                side_effect=fake_subscription,
+            )
+        )
 
         async def fake_retrieve_user_tokens_from_db(redis_cache, owner_id):
             if owner_id == config.TESTING_ORGANIZATION_ID:
@@ -512,22 +615,29 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
                 return await real_get_user_tokens(redis_cache, owner_id)
             return user_tokens.UserTokens(redis_cache, owner_id, {})
 
-        mock.patch(
-            "mergify_engine.user_tokens.UserTokens._retrieve_from_db",
-            side_effect=fake_retrieve_user_tokens_from_db,
-        ).start()
+        self._patches.enter_context(
+            mock.patch(
+                "mergify_engine.user_tokens.UserTokens._retrieve_from_db",
+                side_effect=fake_retrieve_user_tokens_from_db,
+            )
+        )
 
-        mock.patch(
-            "mergify_engine.user_tokens.UserTokens.get",
-            side_effect=fake_user_tokens,
-        ).start()
+        self._patches.enter_context(
+            mock.patch(
+                "mergify_engine.user_tokens.UserTokens.get",
+                side_effect=fake_user_tokens,
+            )
+        )
 
-        mock.patch(
-            "github.MainClass.Installation.Installation.get_repos",
-            return_value=[self.r_o_integration],
-        ).start()
+        self._patches.enter_context(
+            mock.patch(
+                "github.MainClass.Installation.Installation.get_repos",
+                return_value=[self.r_o_integration],
+            )
+        )
 
         self._event_reader = EventReader(self.app)
+        self.addAsyncCleanup(self._event_reader.aclose)
         await self._event_reader.drain()
 
         # NOTE(sileht): Prepare a fresh redis
@@ -556,34 +666,74 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
 
             branches = list(self.r_o_admin.get_git_matching_refs("heads/20"))
             branches.extend(self.r_o_admin.get_git_matching_refs("heads/mergify"))
+            fork_branches = []
             try:
-                branches.extend(self.r_fork.get_git_matching_refs("heads/20"))
-                branches.extend(self.r_fork.get_git_matching_refs("heads/mergify"))
+                fork_branches.extend(self.r_fork.get_git_matching_refs("heads/20"))
+                fork_branches.extend(self.r_fork.get_git_matching_refs("heads/mergify"))
             except pygithub.GithubException as e:
                 if e.data["message"] != "Git Repository is empty.":
                     raise
-            for branch in branches:
-                if "branch_protection" in branch.ref:
-                    try:
-                        self.branch_protection_unprotect(branch.ref)
-                    except pygithub.GithubException as e:
-                        if e.status != 404:
-                            raise
-
-                branch.delete()
-
-            for label in self.r_o_admin.get_labels():
-                label.delete()
 
-            for pull in self.r_o_admin.get_pulls():
-                pull.edit(state="closed")
+            # Each cleanup request is independent, so send them
+            # concurrently instead of paying one round-trip per object
+            async with self._get_cleanup_client(
+                config.ORG_ADMIN_PERSONAL_TOKEN
+            ) as admin_client, self._get_cleanup_client(
+                self.FORK_PERSONAL_TOKEN
+            ) as fork_client:
+                await asyncio.gather(
+                    *(
+                        self._delete_branch(admin_client, admin_client, branch)
+                        for branch in branches
+                    ),
+                    *(
+                        self._delete_branch(admin_client, fork_client, branch)
+                        for branch in fork_branches
+                    ),
+                )
+                # Pulls are listed once the branches are gone, as
+                # deleting their head branch already closes most of them
+                await asyncio.gather(
+                    *(
+                        admin_client.delete(label.url)
+                        for label in self.r_o_admin.get_labels()
+                    ),
+                    *(
+                        admin_client.patch(pull.url, json={"state": "closed"})
+                        for pull in self.r_o_admin.get_pulls()
+                    ),
+                )
 
         await self.app.aclose()
         await web.shutdown()
 
         await self._event_reader.drain()
         await self.clear_redis_stream()
-        mock.patch.stopall()
+
+    @staticmethod
+    def _get_cleanup_client(token):
+        return http.AsyncClient(
+            headers={
+                "Authorization": f"token {token}",
+                "Accept": BRANCH_PROTECTION_MEDIA_TYPE,
+            },
+            # Requests above the connections limit wait for a free one, this
+            # keeps us under GitHub secondary rate limits. HTTP/2 is left
+            # disabled on purpose: it multiplexes all requests on a single
+            # connection, so max_connections wouldn't bound them anymore.
+            timeout=httpx.Timeout(5.0, read=10.0, pool=None),
+            limits=httpx.Limits(max_connections=CLEANUP_MAX_CONCURRENCY),
+        )
+
+    async def _delete_branch(self, admin_client, client, branch):
+        if "branch_protection" in branch.ref:
+            try:
+                await admin_client.delete(
+                    f"{self.branches_api_url}{branch.ref}/protection"
+                )
+            except http.HTTPNotFound:
+                pass
+        await client.delete(branch.url)
 
     async def wait_for(self, *args, **kwargs):
         return await self._event_reader.wait_for(*args, **kwargs)
@@ -595,15 +745,13 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
         )
         w.start()
 
-        started_at = None
+        # Wait for the workers to stay idle for `timeout`, and
+        # check that no stream is scheduled for later before stopping them
         while True:
-            if w._redis_stream is None or (await w._redis_stream.zcard("streams")) > 0:
-                started_at = None
-            elif started_at is None:
-                started_at = time.monotonic()
-            elif time.monotonic() - started_at >= timeout:
-                break
+            await w._idle.wait()
             await asyncio.sleep(timeout)
+            if w._idle.is_set() and (await w._redis_stream.zcard("streams")) == 0:
+                break
 
         w.stop()
         await w.wait_shutdown_complete()
@@ -621,7 +769,7 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
         if test_branches is None:
             test_branches = []
         if files is None:
-            files = []
+            files = {}
 
         await self.git.configure()
         await self.git.add_cred(
@@ -637,19 +785,16 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
         await self.git("remote", "add", "fork", self.url_fork)
 
         if mergify_config:
-            with open(self.git.tmp + "/.mergify.yml", "w") as f:
-                f.write(mergify_config)
-            await self.git("add", ".mergify.yml")
+            initial_file = ".mergify.yml"
+            initial_content = mergify_config
         else:
-            with open(self.git.tmp + "/.gitkeep", "w") as f:
-                f.write("repo must not be empty")
-            await self.git("add", ".gitkeep")
+            initial_file = ".gitkeep"
+            initial_content = "repo must not be empty"
+        await self._write_files({initial_file: initial_content, **files})
 
+        await self.git("add", initial_file)
         if files:
-            for name, content in files.items():
-                with open(self.git.tmp + "/" + name, "w") as f:
-                    f.write(content)
-                await self.git("add", name)
+            await self.git("add", *files)
 
         await self.git("commit", "--no-edit", "-m", "initial commit")
         await self.git("branch", "-M", self.master_branch_name)
@@ -666,56 +811,33 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
 
         self.r_o_admin.edit(default_branch=self.master_branch_name)
 
+    async def _write_files(self, files):
+        # Write all files in one executor call to not block the
+        # event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, write_files, self.git.tmp, files
+        )
+
     @staticmethod
     def response_filter(response):
-        for h in [
-            "CF-Cache-Status",
-            "CF-RAY",
-            "Expect-CT",
-            "Report-To",
-            "NEL",
-            "cf-request-id",
-            "Via",
-            "X-GitHub-Request-Id",
-            "Date",
-            "ETag",
-            "X-RateLimit-Reset",
-            "Expires",
-            "Fastly-Request-ID",
-            "X-Timer",
-            "X-Served-By",
-            "Last-Modified",
-            "X-RateLimit-Remaining",
-            "X-Runtime-rack",
-            "Access-Control-Allow-Origin",
-            "Access-Control-Expose-Headers",
-            "Cache-Control",
-            "Content-Security-Policy",
-            "Referrer-Policy",
-            "Server",
-            "Status",
-            "Strict-Transport-Security",
-            "Vary",
-            "X-Content-Type-Options",
-            "X-Frame-Options",
-            "X-XSS-Protection",
-        ]:
-            response["headers"].pop(h, None)
-
-        if "body" in response:
-            # Urllib3 vcrpy format
-            try:
-                data = json.loads(response["body"]["string"].decode())
-            except ValueError:
-                data = None
-        else:
-            # httpx vcrpy format
-            try:
-                data = json.loads(response["content"])
-            except ValueError:
-                data = None
+        headers = response["headers"]
+        for h in RESPONSE_HEADERS_FILTERED.intersection(headers):
+            del headers[h]
 
-        if data and "token" in data:
+        try:
+            if "body" in response:
+                # Urllib3 vcrpy format
+                content = response["body"]["string"].decode()
+            else:
+                # httpx vcrpy format
+                content = response["content"]
+            # Only token responses need to be rewritten, so don't
+            # parse every recorded body to find them
+            data = json.loads(content) if '"token"' in content else None
+        except ValueError:
+            data = None
+
+        if isinstance(data, dict) and "token" in data:
             data["token"] = "<TOKEN>"
             if "body" in response:
                 # Urllib3 vcrpy format
@@ -751,20 +873,10 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
         title = f"Pull request n{self.pr_counter} from {base_repo}"
 
         await self.git("checkout", "--quiet", f"{base_repo}/{base}", "-b", branch)
-        if files:
-            for name, content in files.items():
-                directory = name.rpartition("/")[0]
-                if directory:
-                    try:
-                        os.makedirs(self.git.tmp + "/" + directory)
-                    except FileExistsError:
-                        pass
-                with open(self.git.tmp + "/" + name, "w") as f:
-                    f.write(content)
-                await self.git("add", name)
-        else:
-            open(self.git.tmp + f"/test{self.pr_counter}", "wb").close()
-            await self.git("add", f"test{self.pr_counter}")
+        if not files:
+            files = {f"test{self.pr_counter}": ""}
+        await self._write_files(files)
+        await self.git("add", *files)
         await self.git("commit", "--no-edit", "-m", title)
         if two_commits:
             await self.git(
@@ -848,25 +960,29 @@ class FunctionalTestBase(unittest.IsolatedAsyncioTestCase):
     def branch_protection_unprotect(self, branch):
         return self.r_o_admin._requester.requestJsonAndCheck(
             "DELETE",
-            f"{self.r_o_admin.url}/branches/{branch}/protection",
-            headers={"Accept": "application/vnd.github.luke-cage-preview+json"},
+            f"{self.branches_api_url}{branch}/protection",
+            # PyGithub adds auth and content headers to the
+            # dict it gets, so it can't be a shared constant
+            headers={"Accept": BRANCH_PROTECTION_MEDIA_TYPE},
         )
 
     def branch_protection_protect(self, branch, rule):
-        if (
-            self.r_o_admin.organization
-            and rule["protection"]["required_pull_request_reviews"]
-        ):
-            rule = copy.deepcopy(rule)
-            rule["protection"]["required_pull_request_reviews"][
-                "dismissal_restrictions"
-            ] = {}
+        protection = rule["protection"]
+        if self.r_o_admin.organization and protection["required_pull_request_reviews"]:
+            # Only copy the part we change
+            protection = {
+                **protection,
+                "required_pull_request_reviews": {
+                    **protection["required_pull_request_reviews"],
+                    "dismissal_restrictions": {},
+                },
+            }
 
         # NOTE(sileht): Not yet part of the API
         # maybe soon https://github.com/PyGithub/PyGithub/pull/527
         return self.r_o_admin._requester.requestJsonAndCheck(
             "PUT",
-            f"{self.r_o_admin.url}/branches/{branch}/protection",
-            input=rule["protection"],
-            headers={"Accept": "application/vnd.github.luke-cage-preview+json"},
+            f"{self.branches_api_url}{branch}/protection",
+            input=protection,
+            headers={"Accept": BRANCH_PROTECTION_MEDIA_TYPE},
         )
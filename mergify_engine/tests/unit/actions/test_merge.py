@@ -140,6 +140,34 @@ my title
             "",
             "default",
         ),
+        (
+            """Hello world
+
+# Commit Message
+my title
+
+#123 is fixed
+
+## Other section
+not in message""",
+            "my title",
+            "#123 is fixed",
+            "default",
+        ),
+        (
+            """# COMMIT MESSAGE
+# Commit Message
+#123 fix
+
+my body
+# Commit Message
+continued
+## Other section
+not in message""",
+            "#123 fix",
+            "my body\ncontinued",
+            "default",
+        ),
         ("Here's my message", "My PR title (#43)", "Here's my message", "title+body"),
     ],
 )
@@ -164,10 +192,13 @@ async def test_merge_commit_message(body, title, message, mode):
     ]
     ctxt._cache["pull_check_runs"] = []
     pr = ctxt.pull_request
-    assert await merge.MergeAction._get_commit_message(pr, mode=mode) == (
-        title,
-        message,
-    )
+    if mode == "title+body":
+        commit_title_and_message = (
+            await merge.MergeAction._get_commit_message_title_body(pr)
+        )
+    else:
+        commit_title_and_message = await merge.MergeAction._get_commit_message(pr)
+    assert commit_title_and_message == (title, message)
 
 
 @pytest.mark.parametrize(
@@ -234,6 +265,51 @@ async def test_merge_commit_message_syntax_error(body, error, redis_cache):
         assert str(rmf) == error
 
 
+@pytest.mark.parametrize(
+    "body",
+    [
+        (
+            """# Commit Message
+{% if false %}{{title}}
+
+{% endif %}real body
+"""
+        ),
+        (
+            """# Commit Message
+{# note
+
+#} body
+"""
+        ),
+        (
+            """# Commit Message
+{% raw %}{{title}}
+
+{% endraw %} body
+"""
+        ),
+        (
+            """# Commit Message
+{% set x = "leaked" %}my title
+
+{{ x }}
+"""
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_merge_commit_message_template_across_title_and_body(body):
+    pull = PR.copy()
+    pull["body"] = body
+    client = mock.MagicMock()
+    installation = context.Installation(123, "whatever", {}, client, None)
+    repository = context.Repository(installation, "whatever")
+    pr = await context.Context.create(repository=repository, pull=pull)
+    with pytest.raises(context.RenderTemplateFailure):
+        await merge.MergeAction._get_commit_message(pr.pull_request)
+
+
 def gen_config(priorities):
     return [{"priority": priority} for priority in priorities]
 
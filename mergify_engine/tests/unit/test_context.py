@@ -238,3 +238,11 @@ async def test_team_members_cache(redis_cache: utils.RedisCache) -> None:
     assert client.called == 7
     assert (await installation.get_team_members(team_slug3)) == []
     assert client.called == 7
+
+
+def test_compile_template_cache() -> None:
+    template = "{{title}} (#{{number}})"
+    compiled, used_variables = context.PullRequest._compile_template(template)
+    assert used_variables == {"title", "number"}
+    assert compiled.render(title="foo", number=42) == "foo (#42)"
+    assert context.PullRequest._compile_template(template)[0] is compiled
@@ -118,6 +118,35 @@ async def test_worker_with_waiting_tasks(
     )
 
 
+@pytest.mark.asyncio
+@mock.patch("mergify_engine.worker.subscription.Subscription.get_subscription")
+@mock.patch("mergify_engine.worker.run_engine")
+async def test_worker_idle(run_engine, _, redis_stream, redis_cache, logger_checker):
+    for installation_id in range(4):
+        await worker.push(
+            redis_stream,
+            installation_id,
+            f"owner-{installation_id}",
+            f"repo-{installation_id}",
+            123,
+            "pull_request",
+            {"payload": installation_id},
+        )
+
+    # Wait for streams to be scheduled
+    await asyncio.sleep(worker.WORKER_PROCESSING_DELAY)
+
+    w = worker.Worker(idle_sleep_time=0.01, enabled_services=["stream"])
+    assert not w._idle.is_set()
+    w.start()
+    await asyncio.wait_for(w._idle.wait(), timeout=10)
+    w.stop()
+    await w.wait_shutdown_complete()
+
+    assert 0 == (await redis_stream.zcard("streams"))
+    assert 4 == len(run_engine.mock_calls)
+
+
 @pytest.mark.asyncio
 @mock.patch("mergify_engine.worker.subscription.Subscription.get_subscription")
 @mock.patch("mergify_engine.worker.run_engine")
@@ -626,6 +626,11 @@ class Worker:
     _tombstone: asyncio.Event = dataclasses.field(
         init=False, default_factory=asyncio.Event
     )
+    # Set once every stream worker has found nothing to do
+    _idle: asyncio.Event = dataclasses.field(init=False, default_factory=asyncio.Event)
+    _idle_worker_ids: typing.Set[int] = dataclasses.field(
+        init=False, default_factory=set
+    )
 
     _worker_tasks: typing.List[asyncio.Task[None]] = dataclasses.field(
         init=False, default_factory=list
@@ -654,6 +659,8 @@ class Worker:
                 stream_name = await stream_selector.next_stream()
                 if stream_name:
                     LOG.debug("worker %s take stream: %s", worker_id, stream_name)
+                    self._idle_worker_ids.discard(worker_id)
+                    self._idle.clear()
                     try:
                         with statsd.timed("engine.stream.consume.time"):
                             await stream_processor.consume(stream_name)
@@ -664,6 +671,9 @@ class Worker:
                             stream_name,
                         )
                 else:
+                    self._idle_worker_ids.add(worker_id)
+                    if len(self._idle_worker_ids) == self.worker_per_process:
+                        self._idle.set()
                     LOG.debug("worker %s has nothing to do, sleeping a bit", worker_id)
                     await self._sleep_or_stop()
             except asyncio.CancelledError: